@@ -1,6 +1,6 @@
 import streamlit as st
 from core.qa_pipeline import load_model_components, extract_text_from_pdf, get_answer
-from core.voice_handler import listen_and_transcribe, text_to_speech
+from core.voice_handler import listen_and_transcribe, start_text_to_speech, wait_for_speech
 from rouge_score import rouge_scorer
 import pandas as pd
 import os
@@ -33,6 +33,10 @@ if 'question' not in st.session_state:
     st.session_state.question = ""
 if 'ui_state' not in st.session_state:
     st.session_state.ui_state = "idle"
+if 'tts_future' not in st.session_state:
+    st.session_state.tts_future = None
+if 'human_eval_submitted' not in st.session_state:
+    st.session_state.human_eval_submitted = False
 
 # --- UI: Sidebar ---
 st.sidebar.title("⚙️ Configuration")
@@ -41,6 +45,12 @@ selected_language = st.sidebar.selectbox("Choose Language", list(MODEL_CONFIG.ke
 st.sidebar.markdown(f"**Model:** `{MODEL_CONFIG[selected_language]['model_name']}`")
 st.sidebar.info("The selected model will be downloaded and cached on its first use.")
 
+# Decoding settings only apply to the generative model
+num_beams, max_new_tokens = 1, 64
+if "flan-t5" in MODEL_CONFIG[selected_language]["model_name"]:
+    num_beams = st.sidebar.slider("Beam Width", 1, 4, 1, help="Greedy decoding (1) is fastest; wider beams cost proportionally more time.")
+    max_new_tokens = st.sidebar.slider("Max Answer Tokens", 16, 200, 64, help="Upper limit on the length of the generated answer.")
+
 use_default_pdf = st.sidebar.checkbox("Use Default 'Moon' PDF", value=True)
 uploaded_file = st.sidebar.file_uploader("Or Upload your own PDF", type="pdf", disabled=use_default_pdf)
 
@@ -49,14 +59,25 @@ st.title("🗣️ Comparative Study of Voice-Based Document QA")
 st.markdown("Select a language, ask a question via text or voice, and get a spoken answer from the document.")
 
 # --- Functions to run QA ---
-def process_question(model_comps, question_text, doc_text):
+def process_question(question_text, doc_text):
     st.session_state.question = question_text
-    answer_data = get_answer(model_comps, st.session_state.question, doc_text)
+    # Loaded here rather than on every rerun: on GPU only one model stays resident,
+    # so loading eagerly would swap models on every widget interaction
+    model_comps = load_model_components(MODEL_CONFIG[selected_language]["model_name"])
+    answer_data = get_answer(
+        model_comps, st.session_state.question, doc_text,
+        num_beams=num_beams, max_new_tokens=max_new_tokens
+    )
     st.session_state.answer_data = answer_data
+    # Start speech synthesis right away so it runs while the answer page renders
+    tts_lang_code = MODEL_CONFIG[selected_language]["lang_code"]
+    st.session_state.tts_future = start_text_to_speech(answer_data['answer'], lang_code=tts_lang_code)
     st.session_state.ui_state = "done"
 
-# Load model components
-model_components = load_model_components(MODEL_CONFIG[selected_language]["model_name"])
+@st.cache_resource
+def get_rouge_scorer():
+    # Built once; constructing it with a stemmer on every rerun is wasted work
+    return rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
 
 # Handle PDF input
 pdf_text = None
@@ -64,11 +85,11 @@ if use_default_pdf:
     default_path = DEFAULT_PDF_PATHS[selected_language]
     if os.path.exists(default_path):
         with open(default_path, "rb") as f:
-            pdf_text = extract_text_from_pdf(f)
+            pdf_text = extract_text_from_pdf(f.read())
     else:
         st.error(f"Default PDF not found at: {default_path}")
 elif uploaded_file:
-    pdf_text = extract_text_from_pdf(uploaded_file)
+    pdf_text = extract_text_from_pdf(uploaded_file.getvalue())
 
 # --- Main Interaction Area ---
 if pdf_text:
@@ -81,7 +102,7 @@ if pdf_text:
         text_question = st.text_input("Type your question here:", key="text_q")
         if st.button("Submit Text Question"):
             if text_question:
-                process_question(model_components, text_question, pdf_text)
+                process_question(text_question, pdf_text)
                 st.rerun()
             else:
                 st.warning("Please enter a question.")
@@ -96,7 +117,7 @@ if pdf_text:
         stt_lang_code = MODEL_CONFIG[selected_language]["stt_lang"]
         transcribed_question = listen_and_transcribe(lang=stt_lang_code)
         if transcribed_question:
-            process_question(model_components, transcribed_question, pdf_text)
+            process_question(transcribed_question, pdf_text)
         else:
             st.session_state.ui_state = "idle"
         st.rerun()
@@ -115,10 +136,12 @@ if pdf_text:
         
         with col2:
             st.write("**Voice Output:**")
-            tts_lang_code = MODEL_CONFIG[selected_language]["lang_code"]
-            audio_file_path = text_to_speech(ans_data['answer'], lang_code=tts_lang_code)
+            audio_file_path = None
+            if st.session_state.tts_future:
+                audio_file_path = wait_for_speech(st.session_state.tts_future)
             if audio_file_path:
-                st.audio(audio_file_path, format='audio/mp3')
+                audio_format = 'audio/wav' if audio_file_path.endswith('.wav') else 'audio/mp3'
+                st.audio(audio_file_path, format=audio_format)
 
         st.header("3. Evaluation Metrics")
         st.markdown("---")
@@ -129,10 +152,12 @@ if pdf_text:
         eval_col1, eval_col2 = st.columns(2)
         with eval_col1:
             st.subheader("🤖 Automated Evaluation (ROUGE)")
-            reference_answer = st.text_input("Provide a 'Gold Standard' reference answer (optional):")
+            # Inside a form, typing doesn't rerun the app; the score updates on submit
+            with st.form("rouge_form"):
+                reference_answer = st.text_input("Provide a 'Gold Standard' reference answer (optional):")
+                st.form_submit_button("Compute ROUGE")
             if reference_answer and ans_data['answer']:
-                scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
-                scores = scorer.score(reference_answer, ans_data['answer'])
+                scores = get_rouge_scorer().score(reference_answer, ans_data['answer'])
                 
                 rouge_df = pd.DataFrame({
                     'Metric': ['Precision', 'Recall', 'F-Measure'],
@@ -144,19 +169,27 @@ if pdf_text:
         
         with eval_col2:
             st.subheader("🧑‍💻 Human Evaluation")
-            correctness = st.slider("Answer Correctness", 1, 5, 3, help="Is the answer factually correct according to the text?")
-            fluency = st.slider("Answer Fluency", 1, 5, 3, help="Is the answer grammatically correct and easy to understand?")
-            voice_clarity = st.slider("Voice Output Clarity", 1, 5, 3, help="How clear and natural was the pronunciation?")
+            # Sliders in a form only rerun the app once, on submit, rather than on every tick
+            with st.form("human_eval_form"):
+                correctness = st.slider("Answer Correctness", 1, 5, 3, help="Is the answer factually correct according to the text?")
+                fluency = st.slider("Answer Fluency", 1, 5, 3, help="Is the answer grammatically correct and easy to understand?")
+                voice_clarity = st.slider("Voice Output Clarity", 1, 5, 3, help="How clear and natural was the pronunciation?")
+                if st.form_submit_button("Submit Evaluation"):
+                    st.session_state.human_eval_submitted = True
             
-            human_scores = pd.DataFrame({
-                'Metric': ['Correctness', 'Fluency', 'Voice Clarity'],
-                'Score': [correctness, fluency, voice_clarity]
-            })
-            st.bar_chart(human_scores.set_index('Metric'))
+            # Only chart real ratings, not the slider defaults
+            if st.session_state.human_eval_submitted:
+                human_scores = pd.DataFrame({
+                    'Metric': ['Correctness', 'Fluency', 'Voice Clarity'],
+                    'Score': [correctness, fluency, voice_clarity]
+                })
+                st.bar_chart(human_scores.set_index('Metric'))
         
         if st.button("🔄 Ask Another Question"):
             st.session_state.question = ""
             st.session_state.answer_data = None
+            st.session_state.tts_future = None
+            st.session_state.human_eval_submitted = False
             st.session_state.ui_state = "idle"
             st.rerun()
 
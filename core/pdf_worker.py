@@ -0,0 +1,13 @@
+# Process-pool worker for PDF text extraction. Kept in its own module that imports only PyMuPDF,
+# because spawned workers re-import the module their target lives in, and core.qa_pipeline
+# pulls in streamlit, torch and transformers.
+import fitz
+
+
+def extract_page_range(args):
+    """
+    Reopens the document (cheap with PyMuPDF) and extracts the text of pages [start, stop).
+    """
+    pdf_bytes, start, stop = args
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [doc[i].get_text("text") for i in range(start, stop)]
@@ -1,11 +1,252 @@
 import streamlit as st
-from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM, BitsAndBytesConfig
 import torch
+import numpy as np
+import atexit
+import gc
+import importlib.util
+import io
+import os
+import platform
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
 
-# Use Streamlit's cache to load models only once
-@st.cache_resource(show_spinner=False) # Spinner is handled in the main app now
+# PyMuPDF is much faster than pdfplumber for plain text; pdfplumber stays as a fallback
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+# CTranslate2 is optional; the FLAN-T5 path falls back to Hugging Face generate() without it
+try:
+    import ctranslate2
+except ImportError:
+    ctranslate2 = None
+
+# Optional retriever: without it every chunk goes through the QA model
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# ONNX Runtime gives the extractive models fused kernels and int8 inference on CPU
+try:
+    from optimum.onnxruntime import ORTModelForQuestionAnswering, ORTOptimizer, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig, OptimizationConfig
+except ImportError:
+    ORTModelForQuestionAnswering = None
+
+# Below this many pages the cost of starting worker processes outweighs the parallel speedup.
+# PyMuPDF reads a text page in roughly 0.1-10 ms, while starting spawned workers (even ones that
+# import only PyMuPDF) measured ~0.5 s, so the pool only pays off on documents of several hundred pages.
+MIN_PAGES_FOR_POOL = 300
+
+# Converted CTranslate2 models, created once with e.g.:
+#   ct2-transformers-converter --model google/flan-t5-base --output_dir models/flan_t5_base_ct2 --quantization int8_float16
+CT2_MODEL_DIRS = {
+    "google/flan-t5-base": "models/flan_t5_base_ct2",
+}
+
+# Optimised, int8-quantised ONNX exports of the extractive models are written here on first use
+ONNX_MODEL_DIR = "models"
+
+# Small multilingual sentence encoder used to pick the chunks worth reading with the QA model
+RETRIEVER_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+RETRIEVER_TOP_K = 4
+
+# On GPU only the model for the selected language is kept in memory; switching languages frees the previous one.
+# st.cache_resource would keep every model ever loaded, which runs out of GPU memory.
+# On CPU, RAM is plentiful and models stay loaded, so sessions on different languages don't evict each other.
+_loaded_models = {}
+_model_load_locks = {} # on CPU, one lock per model, so a slow first load doesn't block other models
+_loaded_models_lock = threading.Lock() # guards the two dicts above, never held while loading
+# On GPU, eviction and loading happen under one lock, so two sessions can't each evict and then
+# load a different model, leaving both resident
+_gpu_load_lock = threading.Lock()
+
+
+def _cpu_supports_bf16():
+    """
+    Checks for native bf16 instructions on the CPU (AVX512-BF16 or AMX-BF16 on x86, BF16 on ARM).
+    Other CPUs, including older AVX-512 ones, emulate bf16 and run it slower than fp32.
+    Only Linux exposes these flags; elsewhere the model stays in fp32.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                # "flags" on x86, "Features" on ARM
+                if line.startswith(("flags", "Features")):
+                    flags = set(line.split(":", 1)[1].split())
+                    return bool(flags & {"avx512_bf16", "amx_bf16", "bf16"})
+    except OSError:
+        pass
+    return False
+
+
+def _load_seq2seq_model(model_name, device):
+    """
+    Loads a seq2seq model in the cheapest precision the hardware handles well.
+    Generation is bound by weight bandwidth, so int8 weights (GPU) or bf16 (CPU) pay off.
+    """
+    # int8 loading and device_map="auto" need both bitsandbytes and accelerate
+    int8_available = all(importlib.util.find_spec(pkg) is not None for pkg in ("bitsandbytes", "accelerate"))
+    if device == "cuda" and int8_available:
+        try:
+            return AutoModelForSeq2SeqLM.from_pretrained(
+                model_name,
+                quantization_config=BitsAndBytesConfig(load_in_8bit=True),
+                device_map="auto"
+            )
+        except Exception as e:
+            print(f"int8 loading failed for {model_name}, loading in full precision instead: {e}")
+    # fp16 is not an option for T5: its activations overflow in half precision
+    if device == "cpu" and _cpu_supports_bf16():
+        return AutoModelForSeq2SeqLM.from_pretrained(model_name, torch_dtype=torch.bfloat16).eval()
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device).eval()
+    if device == "cuda" and hasattr(torch, "compile"):
+        # Compile forward() rather than the module: generate() calls forward() on the original module.
+        # dynamic=True avoids recompiling for every new decode length.
+        model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+
+def _autocast_dtype(model, device):
+    """
+    Returns the dtype to autocast generation to, or None to run the model as loaded.
+    Only an fp32 model on a bf16-capable GPU benefits; fp16 is avoided since T5 overflows in it.
+    """
+    if device == "cuda" and model.dtype == torch.float32 and not getattr(model, "is_loaded_in_8bit", False):
+        if torch.cuda.is_bf16_supported():
+            return torch.bfloat16
+    return None
+
+def _load_ct2_translator(model_name, device):
+    """Returns a CTranslate2 translator for the model if it has been converted, otherwise None."""
+    model_dir = CT2_MODEL_DIRS.get(model_name)
+    if ctranslate2 is None or model_dir is None or not os.path.isdir(model_dir):
+        return None
+    # int8_float16 is the stable mixed type on GPU; the CPU backend has no fp16 kernels
+    compute_type = "int8_float16" if device == "cuda" else "int8"
+    return ctranslate2.Translator(model_dir, device=device, compute_type=compute_type)
+
+
+def _load_ort_qa_model(model_name):
+    """
+    Returns an ONNX Runtime version of a QA model for CPU inference.
+    On first use the model is exported to ONNX, graph-optimised (ORT_ENABLE_ALL) and dynamically
+    quantised to int8, and the result is saved under ONNX_MODEL_DIR for later runs.
+    """
+    model_dir = os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "_") + "_onnx_int8")
+    if not os.path.isdir(model_dir):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            optimized_dir = os.path.join(tmp_dir, "optimized")
+            quantized_dir = os.path.join(tmp_dir, "quantized")
+
+            ort_model = ORTModelForQuestionAnswering.from_pretrained(model_name, export=True)
+            ORTOptimizer.from_pretrained(ort_model).optimize(
+                save_dir=optimized_dir, optimization_config=OptimizationConfig(optimization_level=99)
+            )
+
+            if platform.machine().lower() in ("arm64", "aarch64"):
+                quantization_config = AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+            else:
+                quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer = ORTQuantizer.from_pretrained(optimized_dir, file_name="model_optimized.onnx")
+            quantizer.quantize(save_dir=quantized_dir, quantization_config=quantization_config)
+
+            # Move into place only once complete, so a failed export is retried next time
+            os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+            shutil.move(quantized_dir, model_dir)
+
+    return ORTModelForQuestionAnswering.from_pretrained(
+        model_dir, file_name="model_optimized_quantized.onnx", provider="CPUExecutionProvider"
+    )
+
+
+def _load_qa_pipeline(model_name, tokenizer_name, device):
+    """
+    Builds the extractive QA pipeline: ONNX Runtime with int8 weights on CPU, or PyTorch
+    with fused scaled-dot-product attention where supported.
+    """
+    if device == "cpu" and ORTModelForQuestionAnswering is not None:
+        try:
+            return pipeline("question-answering", model=_load_ort_qa_model(model_name), tokenizer=tokenizer_name)
+        except Exception as e:
+            print(f"ONNX Runtime setup failed for {model_name}, using PyTorch instead: {e}")
+
+    try:
+        return pipeline(
+            "question-answering",
+            model=model_name,
+            tokenizer=tokenizer_name,
+            device=device,
+            model_kwargs={"attn_implementation": "sdpa"}
+        )
+    except ValueError:
+        # Older transformers releases have no SDPA path for BERT; BetterTransformer uses the same kernels
+        qa_pipeline = pipeline(
+            "question-answering",
+            model=model_name,
+            tokenizer=tokenizer_name,
+            device=device
+        )
+        try:
+            from optimum.bettertransformer import BetterTransformer
+            qa_pipeline.model = BetterTransformer.transform(qa_pipeline.model, keep_original_model=False)
+        except ImportError:
+            # optimum isn't installed, or is a release that no longer ships BetterTransformer
+            pass
+        return qa_pipeline
+
+
+def _release_models():
+    """
+    Drops every loaded model and hands the freed memory back to the system.
+    The memory is only returned once no running script still holds a reference to the model.
+    """
+    with _loaded_models_lock:
+        _loaded_models.clear()
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+        torch.cuda.ipc_collect()
+
+
+atexit.register(_release_models)
+
+
 def load_model_components(model_name, tokenizer_name=None):
+    """
+    Returns the components for a model, loading them on first use.
+    On GPU, loading a different model unloads the previous one first, so only one model is resident.
+    Sessions using different languages on one GPU therefore reload models whenever they alternate;
+    the app only calls this when a question is asked, not on every rerun.
+    """
+    key = (model_name, tokenizer_name)
+    with _loaded_models_lock:
+        if key in _loaded_models:
+            return _loaded_models[key]
+        load_lock = _gpu_load_lock if torch.cuda.is_available() else _model_load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        # Another session may have finished loading this model while we waited
+        with _loaded_models_lock:
+            if key in _loaded_models:
+                return _loaded_models[key]
+        if torch.cuda.is_available():
+            _release_models()
+        components = _load_model_components(model_name, tokenizer_name)
+        with _loaded_models_lock:
+            _loaded_models[key] = components
+        return components
+
+
+def _load_model_components(model_name, tokenizer_name=None):
     """
     Loads all necessary components for a model: pipeline, raw model, or tokenizer.
     This is a more flexible approach to handle different model types.
@@ -20,27 +261,60 @@ def load_model_components(model_name, tokenizer_name=None):
     # Load FLAN-T5 for a generative approach
     if "flan-t5" in model_name:
         tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device)
+        translator = _load_ct2_translator(model_name, device)
+        model = None if translator else _load_seq2seq_model(model_name, device)
+        autocast_dtype = _autocast_dtype(model, device) if model is not None else None
         st.success(f"Generative Model '{model_name}' loaded successfully!")
-        return {"model": model, "tokenizer": tokenizer, "pipeline": None, "device": device}
+        return {
+            "model_name": model_name, "model": model, "translator": translator,
+            "tokenizer": tokenizer, "pipeline": None, "device": device, "autocast_dtype": autocast_dtype
+        }
     
     # Load other models into an extractive QA pipeline
     else:
-        qa_pipeline = pipeline(
-            "question-answering",
-            model=model_name,
-            tokenizer=tokenizer_name,
-            device=device
-        )
+        qa_pipeline = _load_qa_pipeline(model_name, tokenizer_name, device)
         st.success(f"Extractive Model '{model_name}' loaded successfully!")
-        return {"pipeline": qa_pipeline, "model": None, "tokenizer": None}
+        return {"model_name": model_name, "pipeline": qa_pipeline, "model": None, "tokenizer": None}
 
 
-def extract_text_from_pdf(pdf_file):
-    """Extracts text from an uploaded PDF file using pdfplumber for robustness."""
-    text = ""
+def _extract_pages_in_pool(pdf_bytes, page_count):
+    """
+    Extracts page texts across a process pool, one contiguous page range per worker.
+    Workers are spawned rather than forked, since forking a process that already runs
+    torch and Streamlit threads can deadlock.
+    """
+    from core.pdf_worker import extract_page_range
+
+    workers = min(os.cpu_count() or 1, page_count)
+    step = -(-page_count // workers)  # ceil division
+    ranges = [(pdf_bytes, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # map() yields results in submission order, so pages stay in order
+        return [text for texts in executor.map(extract_page_range, ranges) for text in texts]
+
+
+# Streamlit reruns the whole script on every interaction, so cache the text by the PDF's bytes
+@st.cache_data(show_spinner=False)
+def extract_text_from_pdf(pdf_bytes):
+    """
+    Extracts text from the raw bytes of a PDF file.
+    Uses PyMuPDF when available, since we only need raw text and not pdfplumber's layout analysis.
+    Longer documents are split across a process pool, one contiguous page range per worker.
+    """
     try:
-        with pdfplumber.open(pdf_file) as pdf:
+        if fitz is not None:
+            # Pass the bytes straight to PyMuPDF, no temp file needed
+            with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+                if doc.page_count >= MIN_PAGES_FOR_POOL and (os.cpu_count() or 1) > 1:
+                    try:
+                        return "\n".join(_extract_pages_in_pool(pdf_bytes, doc.page_count))
+                    except Exception as e:
+                        # A broken pool shouldn't fail the document; read it serially instead
+                        print(f"Parallel PDF extraction failed, reading pages serially: {e}")
+                return "\n".join(page.get_text("text") for page in doc)
+
+        text = ""
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
             for page in pdf.pages:
                 page_text = page.extract_text()
                 if page_text:
@@ -50,59 +324,211 @@ def extract_text_from_pdf(pdf_file):
         st.error(f"Error reading PDF file: {e}")
         return None
 
-def get_answer(model_components, question, pdf_text):
+def _chunk_offsets(text_len, max_chunk_len=512, overlap=100):
+    """
+    Returns the character offsets of overlapping chunks as an (n, 2) int32 array of [start, end) rows.
+    Chunks are sliced from the text only when needed, instead of building every string up front.
+    """
+    starts = np.arange(0, text_len, max_chunk_len - overlap, dtype=np.int32)
+    ends = np.minimum(starts + max_chunk_len, text_len).astype(np.int32)
+    return np.stack([starts, ends], axis=1)
+
+
+def _chunk_text(pdf_text, offsets, i):
+    """Slices chunk i out of the document."""
+    start, end = offsets[i]
+    return pdf_text[start:end]
+
+
+@st.cache_resource(show_spinner=False)
+def _load_retriever(encoder_name=RETRIEVER_MODEL_NAME):
+    """Loads the sentence encoder used for retrieval, or returns None if it isn't installed."""
+    if SentenceTransformer is None:
+        return None
+    return SentenceTransformer(encoder_name)
+
+
+@st.cache_data(show_spinner=False)
+def _embed_chunks(pdf_text, encoder_name=RETRIEVER_MODEL_NAME):
+    """Embeds every chunk of the document once; rows are L2-normalised float32 vectors."""
+    encoder = _load_retriever(encoder_name)
+    offsets = _chunk_offsets(len(pdf_text))
+    chunks = [_chunk_text(pdf_text, offsets, i) for i in range(len(offsets))]
+    embeddings = encoder.encode(chunks, normalize_embeddings=True, convert_to_numpy=True)
+    return embeddings.astype(np.float32)
+
+
+class RetrievalError(Exception):
+    """Raised when the sentence encoder fails, so get_answer can retry without retrieval."""
+
+
+def _select_chunks(question, pdf_text, top_k=RETRIEVER_TOP_K, use_retrieval=True):
+    """
+    Returns (offsets, selected): the document's chunk offsets and the indices of the top_k chunks
+    most similar to the question, best first. selected is None when no retrieval happened: the
+    document has at most top_k chunks, no retriever is installed, or use_retrieval is False.
+    Encoder failures raise RetrievalError, so the answer cache never keeps a degraded result.
+    """
+    offsets = _chunk_offsets(len(pdf_text))
+    if not use_retrieval or len(offsets) <= top_k:
+        return offsets, None
+    try:
+        encoder = _load_retriever()
+        if encoder is None:
+            return offsets, None
+        embeddings = _embed_chunks(pdf_text)
+        scores = embeddings @ encoder.encode(question, normalize_embeddings=True, convert_to_numpy=True)
+    except Exception as e:
+        raise RetrievalError(e) from e
+    top = np.argpartition(-scores, top_k)[:top_k]
+    return offsets, top[np.argsort(-scores[top])]
+
+
+def _retrieve_chunks(question, pdf_text, top_k=RETRIEVER_TOP_K, use_retrieval=True):
+    """Returns the top_k chunks most similar to the question, best first, or all chunks without retrieval."""
+    if not pdf_text or not isinstance(pdf_text, str):
+        return []
+    offsets, selected = _select_chunks(question, pdf_text, top_k, use_retrieval)
+    if selected is None:
+        selected = range(len(offsets))
+    # Only the selected chunks are sliced out of the document
+    return [_chunk_text(pdf_text, offsets, i) for i in selected]
+
+
+def _retrieve_context(question, pdf_text, top_k=RETRIEVER_TOP_K, use_retrieval=True):
+    """
+    Returns the passages most relevant to the question as one text, in document order, with
+    overlapping chunks merged so no text appears twice. Returns None when no retrieval happened,
+    in which case the caller should use the whole document.
+    """
+    offsets, selected = _select_chunks(question, pdf_text, top_k, use_retrieval)
+    if selected is None:
+        return None
+    passages = []
+    for start, end in sorted(offsets[i].tolist() for i in selected):
+        if passages and start <= passages[-1][1]:
+            passages[-1][1] = max(passages[-1][1], end)
+        else:
+            passages.append([start, end])
+    return "\n\n".join(pdf_text[start:end] for start, end in passages)
+
+
+def get_answer(model_components, question, pdf_text, num_beams=1, max_new_tokens=64):
     """
     Finds an answer using the appropriate method (generative for T5, extractive for others).
-    The extractive method now uses a more robust top-k search across all chunks.
+    num_beams and max_new_tokens control decoding on the generative path; greedy decoding
+    with a short cap is usually enough for factoid answers.
+    Results are cached per (model, question, document, settings), so Streamlit reruns triggered by
+    unrelated widgets don't run inference again.
+    """
+    args = (model_components, model_components["model_name"], question, pdf_text, num_beams, max_new_tokens)
+    # st.cache_data doesn't cache exceptions, so asking again retries instead of replaying a failure
+    try:
+        try:
+            return _get_answer_cached(*args, use_retrieval=True)
+        except RetrievalError as e:
+            # e.g. offline with the encoder not downloaded yet: read the whole document instead.
+            # use_retrieval is part of the cache key, so this answer never stands in for a retrieved one.
+            print(f"Retrieval failed, reading all chunks instead: {e}")
+            return _get_answer_cached(*args, use_retrieval=False)
+    except Exception as e:
+        st.error(f"Error while answering the question: {e}")
+        # The app reruns right after answering, so carry the error in the answer too
+        return {'answer': f"An error occurred while answering the question: {e}", 'score': 0, 'context': "N/A"}
+
+
+# The leading underscore tells Streamlit not to hash the model components; model_name keys them instead
+@st.cache_data(show_spinner=False)
+def _get_answer_cached(_model_components, model_name, question, pdf_text, num_beams, max_new_tokens, use_retrieval):
+    """
+    Runs the actual QA for get_answer.
+    The extractive method uses a more robust top-k search across all chunks.
     """
+    model_components = _model_components
+
     # --- Generative Path for FLAN-T5 ---
-    if model_components.get("model") and "t5" in model_components["model"].name_or_path:
+    if model_components.get("translator") or model_components.get("model"):
+        translator = model_components.get("translator")
         model = model_components["model"]
         tokenizer = model_components["tokenizer"]
         device = model_components["device"]
         
-        input_text = f"question: {question} context: {pdf_text}"
-        inputs = tokenizer(input_text, return_tensors="pt", max_length=1024, truncation=True).to(device)
+        # Feed only the passages most relevant to the question instead of a truncated prefix of the document.
+        # Without retrieval, fall back to the document itself with the original 1024-token budget.
+        retrieved = _retrieve_context(question, pdf_text, use_retrieval=use_retrieval)
+        input_text = f"question: {question} context: {retrieved if retrieved is not None else pdf_text}"
+        max_input_len = 512 if retrieved is not None else 1024
         
         with st.spinner("Generating answer with FLAN-T5..."):
-            outputs = model.generate(**inputs, max_length=200, num_beams=4, early_stopping=True)
-            answer = tokenizer.decode(outputs[0], skip_special_tokens=True)
+            if translator:
+                input_ids = tokenizer.encode(input_text, max_length=max_input_len, truncation=True)
+                results = translator.translate_batch(
+                    [tokenizer.convert_ids_to_tokens(input_ids)], beam_size=num_beams, max_decoding_length=max_new_tokens
+                )
+                output_ids = tokenizer.convert_tokens_to_ids(results[0].hypotheses[0])
+                answer = tokenizer.decode(output_ids, skip_special_tokens=True)
+            else:
+                inputs = tokenizer(input_text, return_tensors="pt", max_length=max_input_len, truncation=True).to(device)
+                autocast_dtype = model_components["autocast_dtype"]
+                with torch.inference_mode(), torch.autocast(
+                    device_type=device, dtype=autocast_dtype, enabled=autocast_dtype is not None
+                ):
+                    # max_new_tokens, unlike max_length, doesn't count the prompt
+                    outputs = model.generate(
+                        **inputs,
+                        max_new_tokens=max_new_tokens,
+                        num_beams=num_beams,
+                        early_stopping=num_beams > 1,
+                        do_sample=False,
+                        use_cache=True
+                    )
+                answer = tokenizer.decode(outputs[0], skip_special_tokens=True)
         
+        if retrieved is not None:
+            context = f"Answer was generated, not extracted. The model used these passages as context:\n\n{retrieved}"
+        else:
+            context = "Answer was generated, not extracted. The model used the full document as context."
         return {
             'answer': answer if answer else "FLAN-T5 could not generate an answer.",
             'score': 1.0,
-            'context': "Answer was generated, not extracted. The model used the full document as context."
+            'context': context
         }
     
     # --- Robust Extractive Path for BERT-based Models ---
     else:
         qa_pipeline = model_components["pipeline"]
-        max_chunk_len = 512
-        overlap = 100
-
-        chunks = []
-        if pdf_text and isinstance(pdf_text, str):
-            for i in range(0, len(pdf_text), max_chunk_len - overlap):
-                chunks.append(pdf_text[i:i + max_chunk_len])
+        # Retrieve-then-read: only the most relevant chunks go through the QA model
+        chunks = _retrieve_chunks(question, pdf_text, use_retrieval=use_retrieval)
         
         if not chunks:
             return {'answer': "The document appears to be empty.", 'score': 0, 'context': "N/A"}
 
         all_candidates = []
-        with st.spinner(f"Searching for top answers in {len(chunks)} document chunks..."):
-            for chunk in chunks:
-                try:
-                    results = qa_pipeline(question=question, context=chunk, top_k=3, handle_impossible_answer=True)
-                    
-                    # --- BUG FIX: Manually add the context to each result ---
-                    # The pipeline result doesn't include the context it was given, so we add it back.
-                    for result in results:
-                        result['context'] = chunk
-                    
-                    all_candidates.extend(results)
-                except Exception as e:
-                    print(f"Error processing a chunk: {e}")
-                    continue
+        with st.spinner(f"Searching for top answers in {len(chunks)} relevant document chunks..."):
+            # One batched call instead of a forward pass per chunk.
+            # Errors propagate to get_answer so that a failed run is never cached as an answer.
+            results = qa_pipeline(
+                question=[question] * len(chunks),
+                context=chunks,
+                top_k=3,
+                handle_impossible_answer=True,
+                batch_size=min(16, len(chunks))
+            )
+            # A single input comes back without the outer per-chunk list
+            if len(chunks) == 1:
+                results = [results]
+
+            for chunk, chunk_results in zip(chunks, results):
+                # With only one answer found, the pipeline returns a dict instead of a list
+                if isinstance(chunk_results, dict):
+                    chunk_results = [chunk_results]
+
+                # --- BUG FIX: Manually add the context to each result ---
+                # The pipeline result doesn't include the context it was given, so we add it back.
+                for result in chunk_results:
+                    result['context'] = chunk
+
+                all_candidates.extend(chunk_results)
         
         valid_candidates = [cand for cand in all_candidates if cand.get('answer')]
 
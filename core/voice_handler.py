@@ -1,12 +1,135 @@
 import streamlit as st
 import speech_recognition as sr
 from gtts import gTTS
+import numpy as np
 import os
-import time
+import hashlib
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+# VAD-based capture needs PyAudio and webrtcvad; without them we fall back to speech_recognition's listener
+try:
+    import pyaudio
+    import webrtcvad
+except ImportError:
+    pyaudio = None
+    webrtcvad = None
+
+# faster-whisper runs Whisper on CTranslate2 with int8 weights; speech_recognition's Whisper is the fallback
+try:
+    import ctranslate2
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+TEMP_AUDIO_DIR = "assets/temp_audio"
+# Oldest generated audio files beyond this count are deleted
+MAX_CACHED_AUDIO_FILES = 50
+_audio_cache_lock = threading.Lock()
+
+# Voice activity detection settings (webrtcvad accepts 10/20/30 ms frames of 16-bit mono PCM)
+VAD_SAMPLE_RATE = 16000
+VAD_FRAME_MS = 30
+VAD_AGGRESSIVENESS = 2 # 0 (least) to 3 (most aggressive at filtering out non-speech)
+VAD_START_WINDOW_MS = 300 # window that must be mostly speech to start recording; also kept as pre-roll
+VAD_END_SILENCE_MS = 300 # window that must be mostly silence to end the recording
+VAD_TRIGGER_RATIO = 0.9 # share of a window's frames needed to start or stop, so a click or cough does neither
+VAD_NO_SPEECH_TIMEOUT_MS = 8000
+VAD_MAX_RECORDING_MS = 30000
+
+WHISPER_MODEL_SIZE = "base"
 
 # Ensure the temporary audio directory exists
-if not os.path.exists("assets/temp_audio"):
-    os.makedirs("assets/temp_audio")
+if not os.path.exists(TEMP_AUDIO_DIR):
+    os.makedirs(TEMP_AUDIO_DIR)
+
+@st.cache_resource
+def _recognizer():
+    """A shared recognizer, so the Whisper model it loads on first use stays in memory between questions."""
+    return sr.Recognizer()
+
+@st.cache_resource(show_spinner=False)
+def _whisper_model(model_size=WHISPER_MODEL_SIZE):
+    """Loads the faster-whisper model once, with int8 weights (and fp16 compute on GPU)."""
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel(model_size, device="cuda", compute_type="int8_float16")
+    return WhisperModel(model_size, device="cpu", compute_type="int8")
+
+def _transcribe(recognizer, audio, language):
+    """Transcribes sr.AudioData with faster-whisper if available, otherwise with speech_recognition's Whisper."""
+    if WhisperModel is None:
+        return recognizer.recognize_whisper(audio, language=language)
+
+    # faster-whisper expects 16 kHz mono float32 samples in [-1, 1]
+    pcm = audio.get_raw_data(convert_rate=16000, convert_width=2)
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    segments, _ = _whisper_model().transcribe(samples, language=language, beam_size=1)
+    text = " ".join(segment.text.strip() for segment in segments).strip()
+    if not text:
+        raise sr.UnknownValueError()
+    return text
+
+def _record_until_silence():
+    """
+    Records from the microphone in 30 ms frames, using webrtcvad with ring-buffer hysteresis:
+    recording starts once most of the last VAD_START_WINDOW_MS is speech, and stops once most of
+    the last VAD_END_SILENCE_MS is silence, instead of waiting on a fixed pause threshold.
+    A single noisy frame (a click or a breath) neither starts nor ends a recording.
+
+    Returns:
+        sr.AudioData: The recorded speech, or None if nobody spoke before the timeout.
+
+    Raises:
+        OSError: If the microphone can't be opened at 16 kHz mono.
+    """
+    vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+    frame_samples = VAD_SAMPLE_RATE * VAD_FRAME_MS // 1000
+    # (frame, is_speech) pairs; before speech starts this is also the pre-roll,
+    # so the first syllable isn't clipped
+    window = deque(maxlen=VAD_START_WINDOW_MS // VAD_FRAME_MS)
+    frames = []
+    elapsed_ms = 0
+
+    audio = pyaudio.PyAudio()
+    try:
+        stream = audio.open(
+            format=pyaudio.paInt16, channels=1, rate=VAD_SAMPLE_RATE,
+            input=True, frames_per_buffer=frame_samples
+        )
+    except OSError:
+        audio.terminate()
+        raise
+    try:
+        while elapsed_ms < VAD_MAX_RECORDING_MS:
+            frame = stream.read(frame_samples, exception_on_overflow=False)
+            elapsed_ms += VAD_FRAME_MS
+            is_speech = vad.is_speech(frame, VAD_SAMPLE_RATE)
+            window.append((frame, is_speech))
+
+            if not frames:
+                # Still waiting for the speaker to start
+                voiced = sum(1 for _, speech in window if speech)
+                if voiced >= VAD_TRIGGER_RATIO * window.maxlen:
+                    frames.extend(f for f, _ in window)
+                    window = deque(maxlen=VAD_END_SILENCE_MS // VAD_FRAME_MS)
+                elif elapsed_ms >= VAD_NO_SPEECH_TIMEOUT_MS:
+                    return None
+                continue
+
+            frames.append(frame)
+            unvoiced = sum(1 for _, speech in window if not speech)
+            if unvoiced >= VAD_TRIGGER_RATIO * window.maxlen:
+                break
+    finally:
+        stream.stop_stream()
+        stream.close()
+        audio.terminate()
+
+    return sr.AudioData(b"".join(frames), VAD_SAMPLE_RATE, 2)
 
 def listen_and_transcribe(lang="en-US"):
     """
@@ -19,17 +142,31 @@ def listen_and_transcribe(lang="en-US"):
     Returns:
         str: The transcribed text, or an error message.
     """
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        st.info("Listening... Please ask your question.")
-        r.pause_threshold = 1.0 # seconds of non-speaking audio before a phrase is considered complete
-        r.adjust_for_ambient_noise(source)
-        audio = r.listen(source)
+    r = _recognizer()
+    st.info("Listening... Please ask your question.")
+    use_vad = pyaudio is not None and webrtcvad is not None
+    if use_vad:
+        try:
+            audio = _record_until_silence()
+        except OSError as e:
+            # Many devices don't accept 16 kHz capture; speech_recognition resamples for us
+            print(f"VAD capture unavailable, using the default listener: {e}")
+            use_vad = False
+        else:
+            if audio is None:
+                st.error("No speech was detected. Please try again.")
+                return None
+    if not use_vad:
+        with sr.Microphone() as source:
+            r.pause_threshold = 0.4 # seconds of non-speaking audio before a phrase is considered complete
+            r.non_speaking_duration = 0.3 # must not exceed pause_threshold
+            r.adjust_for_ambient_noise(source, duration=0.3) # the 1 s default delays every question
+            audio = r.listen(source)
 
     try:
         st.info("Transcribing speech...")
         # Using the whisper model for transcription
-        text = r.recognize_whisper(audio, language=lang.split('-')[0])
+        text = _transcribe(r, audio, lang.split('-')[0])
         st.success(f"Transcribed Question: {text}")
         return text
     except sr.UnknownValueError:
@@ -39,9 +176,70 @@ def listen_and_transcribe(lang="en-US"):
         st.error(f"Could not request results from Whisper service; {e}")
         return None
 
+@st.cache_resource
+def _tts_executor():
+    """A small shared thread pool, so gTTS network calls run off the Streamlit script thread."""
+    return ThreadPoolExecutor(max_workers=2)
+
+def _piper_voice(lang_code):
+    """
+    Returns the local Piper voice model for a language, set via e.g. PIPER_VOICE_EN=/path/to/voice.onnx.
+    Returns None if no voice is configured or the piper binary isn't installed, in which case gTTS is used.
+    """
+    if shutil.which("piper") is None:
+        return None
+    return os.environ.get(f"PIPER_VOICE_{lang_code.upper()}")
+
+def _prune_audio_cache(max_files=MAX_CACHED_AUDIO_FILES):
+    """Deletes the least recently used audio files so the cache directory doesn't grow forever."""
+    with _audio_cache_lock:
+        audio_files = [
+            os.path.join(TEMP_AUDIO_DIR, name) for name in os.listdir(TEMP_AUDIO_DIR)
+            if name.endswith((".mp3", ".wav"))
+        ]
+        audio_files.sort(key=os.path.getmtime, reverse=True)
+        for path in audio_files[max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _synthesize_speech(text, lang_code):
+    """
+    Converts text to speech and returns the audio file path. Raises on failure.
+    Files are named by a hash of (lang_code, text), so repeated answers are served from disk.
+    """
+    voice = _piper_voice(lang_code)
+    extension = "wav" if voice else "mp3"
+    digest = hashlib.blake2b(f"{lang_code}|{text}".encode("utf-8"), digest_size=8).hexdigest()
+    audio_file = f"{TEMP_AUDIO_DIR}/{digest}.{extension}"
+    if os.path.exists(audio_file):
+        os.utime(audio_file) # mark as recently used
+        return audio_file
+
+    # Write to a unique temporary file first so a half-written file is never served from the cache,
+    # even when two jobs synthesise the same answer at once
+    fd, partial_file = tempfile.mkstemp(dir=TEMP_AUDIO_DIR, suffix=".part")
+    os.close(fd)
+    try:
+        if voice:
+            # Offline synthesis, no network round-trip
+            subprocess.run(
+                ["piper", "--model", voice, "--output_file", partial_file],
+                input=text.encode("utf-8"), check=True, capture_output=True
+            )
+        else:
+            gTTS(text=text, lang=lang_code, slow=False).save(partial_file)
+        os.replace(partial_file, audio_file)
+    except BaseException:
+        os.remove(partial_file)
+        raise
+    _prune_audio_cache()
+    return audio_file
+
 def text_to_speech(text, lang_code="en"):
     """
-    Converts text to speech using gTTS and returns the path to the audio file.
+    Converts text to speech using gTTS (or Piper, if configured) and returns the path to the audio file.
 
     Args:
         text (str): The text to be converted to speech.
@@ -51,12 +249,41 @@ def text_to_speech(text, lang_code="en"):
         str: The file path of the generated audio file.
     """
     try:
-        tts = gTTS(text=text, lang=lang_code, slow=False)
-        # Use a timestamp to create a unique filename
-        timestamp = int(time.time())
-        audio_file = f"assets/temp_audio/response_{lang_code}_{timestamp}.mp3"
-        tts.save(audio_file)
-        return audio_file
+        return _synthesize_speech(text, lang_code)
+    except Exception as e:
+        st.error(f"Failed to generate speech: {e}")
+        return None
+
+def start_text_to_speech(text, lang_code="en"):
+    """
+    Starts converting text to speech in the background, so the network round-trip
+    overlaps with the rest of the script run.
+
+    Args:
+        text (str): The text to be converted to speech.
+        lang_code (str): The language code for gTTS (e.g., 'en', 'sa', 'ja').
+
+    Returns:
+        Future: Pass it to wait_for_speech() to get the audio file path.
+    """
+    return _tts_executor().submit(_synthesize_speech, text, lang_code)
+
+def wait_for_speech(future, timeout=5):
+    """
+    Waits for a background text-to-speech job started with start_text_to_speech().
+
+    Args:
+        future (Future): The job returned by start_text_to_speech().
+        timeout (float): Seconds to wait before giving up.
+
+    Returns:
+        str: The file path of the generated audio file, or None on failure.
+    """
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        st.error("Speech generation timed out.")
+        return None
     except Exception as e:
         st.error(f"Failed to generate speech: {e}")
-        return None
\ No newline at end of file
+        return None